@@ -1,9 +1,14 @@
+import io
 import os
+import queue
 import random
 import subprocess
+import threading
 import time
+from pathlib import Path
+from typing import Optional, Tuple
 
-from immich import get_image_ids, download_image
+from immich import IMMICH_IMAGE_SIZE, get_image_ids, fetch_image
 from PIL import Image
 
 from dotenv import load_dotenv
@@ -13,39 +18,62 @@ load_dotenv()
 display = auto()
 ORIENTATION = os.getenv("ORIENTATION", "landscape").lower()
 
+# Display-ready (cropped and dithered) images, keyed by asset id and render settings
+CACHE_DIR = Path(__file__).resolve().parent.parent / "cache"
+# Same default saturation the Inky drivers use in `set_image`
+SATURATION = 0.5
+# Retry delays (seconds) while Immich is unreachable or the album is empty
+BACKOFF_BASE = 15
+BACKOFF_CAP = 600
+# Drivers whose `set_image` sends a palette image's indices to the panel as-is
+RAW_INDEX_DRIVERS = ("inky_uc8159", "inky_ac073tc1a")
 
-def convert_heic_to_jpg(heic_path: str) -> str:
-    """Convert HEIC file to JPG using ImageMagick."""
-    jpg_path = heic_path.rsplit(".", 1)[0] + ".jpg"
-    subprocess.run(["convert", heic_path, jpg_path], check=True)
-    os.remove(heic_path)
-    return jpg_path
+
+# ISO-BMFF brands used by HEIC/HEIF files, which Pillow cannot decode
+HEIF_BRANDS = (b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1")
+
+
+def is_heif(data: bytes) -> bool:
+    """Return True if `data` looks like a HEIC/HEIF file."""
+    return data[4:8] == b"ftyp" and data[8:12] in HEIF_BRANDS
+
+
+def convert_heic_to_jpg(data: bytes) -> bytes:
+    """Convert HEIC image data to JPG using ImageMagick, without temp files."""
+    result = subprocess.run(
+        ["convert", "heic:-", "jpg:-"], input=data, capture_output=True, check=True
+    )
+    return result.stdout
 
 print(f"Detected Inky display: {display}")
 
-def crop_image_to_display(image_path: str, display) -> Image.Image:
+def crop_image_to_display(source, display) -> Image.Image:
     resolution = display.resolution
     if ORIENTATION == "portrait":
         resolution = (resolution[1], resolution[0])
 
-    with Image.open(image_path) as img:
-        img_ratio = img.width / img.height
-        display_ratio = resolution[0] / resolution[1]
+    with Image.open(source) as img:
+        # Let libjpeg scale down during decode; a no-op for other formats
+        img.draft("RGB", (resolution[0] * 2, resolution[1] * 2))
 
-        if img_ratio > display_ratio:
-            new_height = img.height
-            new_width = int(new_height * display_ratio)
+        iw, ih = img.size
+        dw, dh = resolution
+
+        if iw * dh > ih * dw:
+            new_height = ih
+            new_width = ih * dw // dh
         else:
-            new_width = img.width
-            new_height = int(new_width / display_ratio)
+            new_width = iw
+            new_height = iw * dh // dw
 
-        left = (img.width - new_width) / 2
-        top = (img.height - new_height) / 2
-        right = (img.width + new_width) / 2
-        bottom = (img.height + new_height) / 2
+        left = (iw - new_width) // 2
+        top = (ih - new_height) // 2
 
-        img_cropped = img.crop((left, top, right, bottom))
-        img_resized = img_cropped.resize(resolution)
+        # Crop and resample in one pass, without a full-size cropped copy.
+        # reducing_gap box-reduces first, so LANCZOS only runs over ~2x the
+        # output size (draft() already does this for JPEGs)
+        box = (left, top, left + new_width, top + new_height)
+        img_resized = img.resize(resolution, Image.LANCZOS, box=box, reducing_gap=2.0)
 
         if ORIENTATION == "portrait":
             img_resized = img_resized.rotate(90, expand=True)
@@ -53,31 +81,192 @@ def crop_image_to_display(image_path: str, display) -> Image.Image:
         return img_resized
 
 
+def quantize_to_display(img: Image.Image, display) -> Image.Image:
+    """Dither an image to the display's colour palette.
 
-def main():
+    Reproduces the conversion the driver's `set_image` would apply, so the
+    panel shows the same pixels. For drivers that re-quantize palette images
+    the result is labelled with the panel's pure colours, which makes
+    `set_image` map each index straight back to itself. Displays without a
+    colour palette get `img` back unchanged.
+    """
+    palette_blend = getattr(display, "_palette_blend", None)
+    if palette_blend is None:
+        return img
+
+    blended = palette_blend(SATURATION)
+    colours = len(blended) // 3
+    raw_indices = type(display).__module__.rsplit(".", 1)[-1] in RAW_INDEX_DRIVERS
+    if raw_indices:
+        # These drivers zero-pad the palette to 256 entries before dithering,
+        # which changes where dark pixels land, so pad it the same way
+        blended = blended + [0, 0, 0] * (256 - colours)
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette(blended)
+
+    quantized = img.convert("RGB").quantize(
+        palette=palette_image, dither=Image.Dither.FLOYDSTEINBERG
+    )
+    if not raw_indices:
+        quantized.putpalette(
+            [c for rgb in display.DESATURATED_PALETTE[:colours] for c in rgb]
+        )
+    return quantized
+
+
+def _cache_path(asset_id: str, display) -> Path:
+    # Every setting that changes the rendered result is part of the key, so
+    # changing one re-renders instead of serving stale cache entries
+    width, height = display.resolution
+    return CACHE_DIR / (
+        f"{asset_id}_{IMMICH_IMAGE_SIZE}_{width}x{height}_{ORIENTATION}"
+        f"_s{SATURATION}.png"
+    )
+
+
+def _save_to_cache(img: Image.Image, cache_path: Path) -> None:
+    """Write a display-ready image to the cache atomically (best-effort)."""
+    tmp = str(cache_path) + ".tmp"
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            # Written once, read many times: favour fast zlib over a smaller file
+            img.save(f, format="PNG", compress_level=1)
+            # Frames are often unplugged; don't let a power cut leave a torn file
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, cache_path)
+    except Exception as e:
+        print(f"Failed to cache {cache_path}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _prune_cache(image_ids) -> None:
+    """Delete cache entries that no current album asset would be served from.
+
+    Covers assets removed from the album as well as entries rendered with
+    other settings or an older naming scheme, which would otherwise stay on
+    the SD card forever.
+    """
+    keep = {_cache_path(asset_id, display).name for asset_id in image_ids}
+    try:
+        with os.scandir(CACHE_DIR) as entries:
+            stale = [e.path for e in entries if e.is_file() and e.name not in keep]
+    except FileNotFoundError:
+        return
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Failed to prune {path}: {e}")
+    if stale:
+        print(f"Pruned {len(stale)} stale cache entries")
+
+
+def _failure_backoff(failures: int) -> float:
+    """Seconds to wait after `failures` consecutive failures.
+
+    Exponential backoff with full jitter, so frames sharing an Immich server
+    don't retry in lockstep after an outage.
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** min(failures, 10)))
+
+
+def _prepare_image(asset_id: str) -> Optional[Tuple[str, Image.Image]]:
+    """Return (source, display-ready image) for an asset, or None on failure."""
+    cache_path = _cache_path(asset_id, display)
+
+    if cache_path.exists():
+        # Shown before: skip the download, crop and dither entirely
+        try:
+            cropped_image = Image.open(cache_path)
+            cropped_image.load()
+            return str(cache_path), cropped_image
+        except (OSError, SyntaxError) as e:
+            # Truncated or corrupt entry: drop it and render the asset afresh
+            print(f"Discarding unreadable cache entry {cache_path}: {e}")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    data = fetch_image(asset_id)
+
+    if not data:
+        print(f"Failed to download image {asset_id}")
+        return None
+
+    # Decode straight from memory; the original never touches the SD card
+    if is_heif(data):
+        data = convert_heic_to_jpg(data)
+    cropped_image = quantize_to_display(
+        crop_image_to_display(io.BytesIO(data), display), display
+    )
+    _save_to_cache(cropped_image, cache_path)
+    return "Immich", cropped_image
+
+
+def _prefetch_images(next_images: "queue.Queue") -> None:
+    """Keep `next_images` filled with the next cropped image to display.
+
+    Runs in a background thread so the download, HEIC conversion and crop of
+    the next image overlap with the current image's display interval.
+    """
+    last_id = None
+    pruned_ids = None
+    failures = 0
     while True:
+        prepared = None
+        try:
+            image_ids = get_image_ids()
 
-        image_ids = get_image_ids()
+            if not image_ids:
+                print("No images found in the specified album.")
+            else:
+                if image_ids != pruned_ids:
+                    # First run or the album changed: drop entries it no longer uses
+                    _prune_cache(image_ids)
+                    pruned_ids = image_ids
+                random_id = random.choice(image_ids)
+                if random_id == last_id and len(image_ids) > 1:
+                    # Same image as last time; pick again rather than re-preparing it
+                    continue
+                prepared = _prepare_image(random_id)
+        except Exception as e:
+            print(f"Failed to prepare next image: {e}")
 
-        if not image_ids:
-            print("No images found in the specified album.")
-            time.sleep(60)
+        if prepared is None:
+            failures += 1
+            time.sleep(_failure_backoff(failures))
             continue
 
-        random_id = random.choice(image_ids)
-        file_path = download_image(random_id)
+        failures = 0
+        source, cropped_image = prepared
+        # Blocks until the display loop has taken the previous image
+        next_images.put((random_id, source, cropped_image))
+        last_id = random_id
+
+
+def main():
+    next_images = queue.Queue(maxsize=1)
+    threading.Thread(target=_prefetch_images, args=(next_images,), daemon=True).start()
+
+    shown_id = None
+    while True:
+        random_id, source, cropped_image = next_images.get()
 
-        if file_path:
-            if file_path.lower().endswith((".heic", ".heif")):
-                file_path = convert_heic_to_jpg(file_path)
-            print(f"Displaying image {random_id} from {file_path}")
-            cropped_image = crop_image_to_display(file_path, display)
+        if random_id == shown_id:
+            # Already on screen: skip the slow e-ink refresh
+            print(f"Image {random_id} is already displayed")
+        else:
+            print(f"Displaying image {random_id} from {source}")
             display.set_image(cropped_image)
             display.show()
+            shown_id = random_id
 
-        else:
-            print(f"Failed to download image {random_id}")
-            
         time.sleep(30)
 
 
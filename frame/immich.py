@@ -1,6 +1,11 @@
+import atexit
+import contextlib
 import logging
 import logging.handlers
 import os
+import random
+import shutil
+import threading
 import time
 from pathlib import Path
 from typing import List, Optional
@@ -15,6 +20,9 @@ dotenv.load_dotenv()
 IMMICH_BASE_URL = os.getenv("IMMICH_BASE_URL", "https://immich.enderles.com")
 IMMICH_API_KEY = os.getenv("IMMICH_API_KEY", "")
 ALBUM_ID = os.getenv("ALBUM_ID", "")
+# Rendition fetched for display: "original", or one of Immich's server-side
+# resized renditions "fullsize", "preview" (default) or "thumbnail"
+IMMICH_IMAGE_SIZE = os.getenv("IMMICH_IMAGE_SIZE", "preview").lower()
 
 # Configure the SDK to talk to the Immich instance and use the API key
 # The server's API routes are under the /api prefix, so include that in host
@@ -23,6 +31,25 @@ configuration = immich_python_sdk.Configuration(host=f"{IMMICH_BASE_URL}/api")
 # Set the API key directly (hardcoded)
 configuration.api_key["api_key"] = IMMICH_API_KEY
 
+# One shared client so every call reuses the same urllib3 connection pool
+# (and its keep-alive connections) instead of building a new one per request
+_API_CLIENT = immich_python_sdk.ApiClient(configuration)
+_ALBUMS_API = immich_python_sdk.AlbumsApi(_API_CLIENT)
+_ASSETS_API = immich_python_sdk.AssetsApi(_API_CLIENT)
+atexit.register(_API_CLIENT.rest_client.pool_manager.clear)
+
+# Album asset IDs are cached for this many seconds between API calls
+_IDS_TTL = 300
+_IDS_CACHE = {"t": 0.0, "ids": []}
+_IDS_LOCK = threading.Lock()
+
+# Downloads are streamed to disk in chunks of this size
+_CHUNK_SIZE = 1 << 20
+
+# Minimum seconds between full tracebacks logged for failed retries
+_EXC_LOG_INTERVAL = 10.0
+_LAST_EXC_LOG = float("-inf")
+
 # Logging configuration: file + console, with rotation to keep logs bounded
 LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -55,13 +82,41 @@ if not logger.handlers:
     ch.setFormatter(formatter)
     logger.addHandler(ch)
 
+# Validate once here; a typo would otherwise fail (and be retried) on every fetch
+_IMAGE_SIZES = ["original"] + [s.value for s in immich_python_sdk.AssetMediaSize]
+if IMMICH_IMAGE_SIZE not in _IMAGE_SIZES:
+    logger.warning(
+        "Unknown IMMICH_IMAGE_SIZE %r (expected one of %s); using 'preview'",
+        IMMICH_IMAGE_SIZE,
+        ", ".join(_IMAGE_SIZES),
+    )
+    IMMICH_IMAGE_SIZE = "preview"
+
+
+def _log_retry_failure(attempts: int, error: Exception) -> None:
+    """Log a final retry failure, with a traceback at most every few seconds.
+
+    During an outage every call fails; capturing a full traceback for each
+    one floods the log and costs a stack walk per failure. Callers of `_retry`
+    therefore log an `ApiException` without `exc_info`; anything else still
+    gets a traceback, since it may not have come through here.
+    """
+    global _LAST_EXC_LOG
+    now = time.monotonic()
+    if now - _LAST_EXC_LOG > _EXC_LOG_INTERVAL:
+        _LAST_EXC_LOG = now
+        logger.exception("Operation failed after %d attempts", attempts)
+    else:
+        logger.error("Operation failed after %d attempts: %s", attempts, error)
+
 
 def _retry(
-    func, retries: int = 3, delay: float = 0.5, backoff: float = 2.0, *args, **kwargs
+    func, *args, retries: int = 3, delay: float = 0.5, backoff: float = 2.0, **kwargs
 ):
-    """Simple retry helper with exponential backoff.
+    """Simple retry helper with jittered exponential backoff.
 
-    Returns whatever func returns, or raises the last exception after retries.
+    Calls func(*args, **kwargs) and returns whatever it returns, or raises the
+    last exception after retries.
     """
     attempt = 0
     while True:
@@ -70,10 +125,13 @@ def _retry(
         except Exception as e:
             attempt += 1
             if attempt > retries:
-                logger.exception("Operation failed after %d attempts", attempt)
+                _log_retry_failure(attempt, e)
                 raise
+            # Equal jitter: desynchronise concurrent callers while keeping at
+            # least half of each delay, so the retries still span an outage
             wait = delay * (backoff ** (attempt - 1))
-            logger.warning(
+            wait = wait / 2 + random.uniform(0, wait / 2)
+            logger.debug(
                 "Operation failed (attempt %d/%d): %s — retrying in %.1fs",
                 attempt,
                 retries,
@@ -83,7 +141,7 @@ def _retry(
             time.sleep(wait)
 
 
-def get_image_ids() -> List[str]:
+def _fetch_image_ids() -> List[str]:
     """Fetch and return a list of image asset IDs from the specified album.
 
     This function is resilient to API errors and will return an empty list
@@ -91,22 +149,16 @@ def get_image_ids() -> List[str]:
     """
     image_ids: List[str] = []
     try:
-
-        def _call():
-            with immich_python_sdk.ApiClient(configuration) as api_client:
-                api_instance = immich_python_sdk.AlbumsApi(api_client)
-                return api_instance.get_album_info(ALBUM_ID)
-
-        api_response = _retry(_call)
+        api_response = _retry(_ALBUMS_API.get_album_info, ALBUM_ID)
         assets = getattr(api_response, "assets", []) or []
 
-        for asset in assets:
-            try:
-                image_ids.append(asset.id)
-            except Exception:
-                logger.exception("Failed to read asset id from asset: %r", asset)
+        image_ids = [a.id for a in assets if getattr(a, "id", None) is not None]
+        if len(image_ids) < len(assets):
+            logger.warning(
+                "Skipped %d album assets without an id", len(assets) - len(image_ids)
+            )
     except ApiException as e:
-        logger.exception("API error while fetching album info: %s", e)
+        logger.error("API error while fetching album info: %s", e)
     except Exception as e:
         logger.exception("Unexpected error while fetching image ids: %s", e)
 
@@ -114,19 +166,83 @@ def get_image_ids() -> List[str]:
     return image_ids
 
 
-def _safe_write(path: Path, data: bytes) -> None:
-    """Write bytes to path atomically (best-effort)."""
-    tmp = path.with_suffix(path.suffix + ".tmp")
+def get_image_ids() -> List[str]:
+    """Return the album's image asset IDs, cached for `_IDS_TTL` seconds.
+
+    Album membership changes rarely, so this avoids a round-trip to the
+    Immich API on every display cycle. Empty results are not cached.
+    """
+    with _IDS_LOCK:
+        now = time.monotonic()
+        if _IDS_CACHE["ids"] and now - _IDS_CACHE["t"] < _IDS_TTL:
+            return _IDS_CACHE["ids"]
+
+        image_ids = _fetch_image_ids()
+        if image_ids:
+            _IDS_CACHE["t"] = now
+            _IDS_CACHE["ids"] = image_ids
+        return image_ids
+
+
+def _safe_copy(path: Path, stream) -> None:
+    """Stream a file-like object to path atomically (best-effort)."""
+    tmp = str(path) + ".tmp"
     try:
-        with tmp.open("wb") as f:
-            f.write(data)
-        tmp.replace(path)
+        with open(tmp, "wb", buffering=_CHUNK_SIZE) as f:
+            shutil.copyfileobj(stream, f, _CHUNK_SIZE)
+        os.replace(tmp, str(path))
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _open_download(asset_id: str, size: str = "original"):
+    """Start downloading an asset and return the unread urllib3 response.
+
+    `size` other than "original" requests one of Immich's server-side
+    renditions (see `IMMICH_IMAGE_SIZE`) instead of the original file.
+    """
+    if size == "original":
+        response = _ASSETS_API.download_asset_without_preload_content(asset_id)
+    else:
+        response = _ASSETS_API.view_asset_without_preload_content(
+            asset_id, size=immich_python_sdk.AssetMediaSize(size)
+        )
+    if response.status >= 400:
+        # Read the (small) error body so the connection is clean for reuse
+        response.drain_conn()
+        response.release_conn()
+        raise ApiException(status=response.status, reason=response.reason)
+    return response
+
+
+@contextlib.contextmanager
+def _download_response(asset_id: str, size: str = "original"):
+    """Open an asset download and release its connection when done."""
+    response = _open_download(asset_id, size)
+    try:
+        yield response
+    except BaseException:
+        # Body only partly read; close rather than pool a dirty connection
+        response.close()
+        raise
     finally:
-        if tmp.exists():
-            try:
-                tmp.unlink()
-            except Exception:
-                pass
+        response.release_conn()
+
+
+def _download_to(asset_id: str, dest: Path) -> None:
+    """Download the original asset to dest; retried as a whole by callers."""
+    with _download_response(asset_id) as response:
+        _safe_copy(dest, response)
+
+
+def _read_download(asset_id: str, size: str) -> bytes:
+    """Download an asset rendition into memory; retried as a whole by callers."""
+    with _download_response(asset_id, size) as response:
+        return response.read()
 
 
 def download_image(asset_id: str) -> Optional[str]:
@@ -138,13 +254,7 @@ def download_image(asset_id: str) -> Optional[str]:
     images_dir.mkdir(parents=True, exist_ok=True)
 
     try:
-
-        def _call_get():
-            with immich_python_sdk.ApiClient(configuration) as api_client:
-                api_instance = immich_python_sdk.AssetsApi(api_client)
-                return api_instance.get_asset_info(asset_id)
-
-        asset = _retry(_call_get)
+        asset = _retry(_ASSETS_API.get_asset_info, asset_id)
 
         # Fallback filename
         raw_name = getattr(asset, "original_file_name", None) or f"{asset.id}"
@@ -154,41 +264,13 @@ def download_image(asset_id: str) -> Optional[str]:
 
         dest = images_dir / safe_name
 
-        def _call_download():
-            with immich_python_sdk.ApiClient(configuration) as api_client:
-                api_instance = immich_python_sdk.AssetsApi(api_client)
-                return api_instance.download_asset(asset_id)
-
-        api_response = _retry(_call_download)
-
-        if api_response is None:
-            logger.error("Download returned no data for asset %s", asset_id)
-            return None
-
-        # api_response may be bytes or a stream-like object. Try to handle bytes first.
-        if isinstance(api_response, (bytes, bytearray)):
-            _safe_write(dest, bytes(api_response))
-        else:
-            # Attempt to read from stream-like object
-            try:
-                data = api_response.read()
-            except Exception:
-                # Last resort: try to write directly
-                try:
-                    with open(dest, "wb") as f:
-                        f.write(api_response)
-                except Exception:
-                    logger.exception(
-                        "Failed to write download result for asset %s", asset_id
-                    )
-                    return None
-            else:
-                _safe_write(dest, data)
+        # Stream the body to disk instead of holding the whole original in memory
+        _retry(_download_to, asset_id, dest)
 
         logger.info("Downloaded asset %s to %s", asset_id, dest)
         return str(dest)
     except ApiException as e:
-        logger.exception("API error while downloading asset %s: %s", asset_id, e)
+        logger.error("API error while downloading asset %s: %s", asset_id, e)
     except IOError as e:
         logger.exception("I/O error while saving asset %s: %s", asset_id, e)
     except Exception as e:
@@ -197,6 +279,29 @@ def download_image(asset_id: str) -> Optional[str]:
     return None
 
 
+def fetch_image(asset_id: str) -> Optional[bytes]:
+    """Download the image asset with the given ID into memory.
+
+    Fetches the `IMMICH_IMAGE_SIZE` rendition. The default server-rendered
+    preview is already downscaled, rotated and converted from HEIC by Immich,
+    so the Pi transfers and decodes far fewer bytes than with the original.
+
+    Returns the raw file contents, or None on failure. Nothing is written to
+    disk; use `download_image` to keep a copy of the original.
+    """
+    try:
+        data = _retry(_read_download, asset_id, IMMICH_IMAGE_SIZE)
+
+        logger.info("Fetched asset %s (%d bytes)", asset_id, len(data))
+        return data
+    except ApiException as e:
+        logger.error("API error while downloading asset %s: %s", asset_id, e)
+    except Exception as e:
+        logger.exception("Unexpected error while downloading asset %s: %s", asset_id, e)
+
+    return None
+
+
 def delete_image(path: str) -> bool:
     """Delete the image asset from the local folder (not immich server).
 
@@ -31,7 +31,8 @@ apt-get install -y imagemagick libheif1 python3-dev
 echo "=== Creating directories ==="
 mkdir -p "$SCRIPT_DIR/images"
 mkdir -p "$SCRIPT_DIR/logs"
-chown -R "$USER:$USER" "$SCRIPT_DIR/images" "$SCRIPT_DIR/logs"
+mkdir -p "$SCRIPT_DIR/cache"
+chown -R "$USER:$USER" "$SCRIPT_DIR/images" "$SCRIPT_DIR/logs" "$SCRIPT_DIR/cache"
 
 # Install Python dependencies
 echo "=== Installing Python dependencies ==="
@@ -80,6 +81,7 @@ if [ ! -f "$SCRIPT_DIR/frame/.env" ]; then
     echo "  IMMICH_API_KEY=your-api-key"
     echo "  ALBUM_ID=your-album-id"
     echo "  ORIENTATION=landscape  # or portrait"
+    echo "  IMMICH_IMAGE_SIZE=preview  # or original, fullsize, thumbnail"
     echo ""
 fi
 